@@ -0,0 +1,14 @@
+# _njit.py — numba shim: JIT-compile when numba is installed, run as plain Python otherwise
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional; kernels still work (slower) without it
+    prange = range
+
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit supporting both @njit and @njit(...)."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def wrap(func):
+            return func
+        return wrap
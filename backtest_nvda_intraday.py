@@ -1,8 +1,14 @@
 # backtest_nvda_intraday.py (NVDA, 1m, RSI 14; Buy<20, Sell>65, 2% SL, 5-min hold)
+import itertools
+import sys
+from zoneinfo import ZoneInfo
 import pandas as pd
 import numpy as np
-import yfinance as yf
-import pytz
+
+from _njit import njit, prange
+from data_cache import load_or_fetch
+from market_hours import day_ids, regular_hours
+from rsi_core import rsi_ndarray
 
 # ---- Params ----
 SYMBOL = "NVDA"
@@ -15,26 +21,27 @@ SLIPPAGE_BPS = 2          # 0.02% per side
 FEE_PER_TRADE = 0.00
 START_CASH = 10000.0
 DAYS_TO_TEST = 5          # last N trading days
+CACHE_TTL_SECONDS = 3600  # reuse downloaded bars for an hour
+# parameter sweep (python backtest_nvda_intraday.py --sweep): every combination is tested
+SWEEP_BUY_RSI = (15, 20, 25, 30)
+SWEEP_SELL_RSI = (55, 60, 65, 70)
+SWEEP_STOP_LOSS_PCT = (0.01, 0.02, 0.03)
+SWEEP_MIN_HOLD_MINUTES = (0, 5, 10)
 # ----------------
 
-TZ_NY = pytz.timezone("America/New_York")
-
-def compute_rsi(series: pd.Series, window: int) -> pd.Series:
-    delta = series.diff()
-    gain = delta.clip(lower=0)
-    loss = -delta.clip(upper=0)
-    avg_gain = gain.ewm(alpha=1/window, adjust=False).mean()
-    avg_loss = loss.ewm(alpha=1/window, adjust=False).mean().replace(0, np.nan)
-    rs = avg_gain / avg_loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi.fillna(50)
+TZ_NY = ZoneInfo("America/New_York")
+TRADE_DECIMALS = {"Price": 4, "RSI": 2, "PnL_%": 3}  # applied once when writing the trade log
+# exit reason codes written by _run_day (-1 on BUY rows) and their trade-log categories
+REASON_NONE, REASON_STOP, REASON_RSI, REASON_EOD = -1, 0, 1, 2
+REASON_LABELS = np.array(["STOP", "RSI>65", "EOD"])
 
 def fetch_recent_days(symbol: str, days: int) -> pd.DataFrame:
     """
     Robust fetch: always return a DataFrame indexed by time with a single 'Close' column
-    and a '__day__' helper column, regardless of whether yfinance used MultiIndex columns.
+    and an int64 '__day__' helper column (see day_ids), regardless of whether yfinance
+    used MultiIndex columns.
     """
-    df = yf.download(symbol, period="7d", interval="1m", auto_adjust=True, progress=False)
+    df = load_or_fetch(symbol, "7d", "1m", CACHE_TTL_SECONDS)
     if df is None or df.empty:
         return pd.DataFrame()
 
@@ -43,7 +50,7 @@ def fetch_recent_days(symbol: str, days: int) -> pd.DataFrame:
         df.index = df.index.tz_localize("UTC").tz_convert(TZ_NY)
     else:
         df.index = df.index.tz_convert(TZ_NY)
-    df = df.between_time("09:30", "16:00")
+    df = regular_hours(df)
 
     # Find the Close series no matter how yfinance structured the columns
     close_series = None
@@ -75,88 +82,128 @@ def fetch_recent_days(symbol: str, days: int) -> pd.DataFrame:
 
     # Build a clean output with a single 'Close' column and a day marker
     out = pd.DataFrame({"Close": pd.to_numeric(close_series, errors="coerce")}).dropna()
-    out["__day__"] = out.index.date
-    keep_days = sorted(out["__day__"].unique())[-days:]
-    out = out[out["__day__"].isin(keep_days)]
+    day_id = day_ids(out.index)
+    if len(day_id):
+        # bars are time-sorted, so the last N days are everything from the Nth-last day on
+        keep = day_id >= np.unique(day_id)[-days:][0]
+        out = out[keep]
+        out["__day__"] = day_id[keep]
     return out
 
 
-def backtest_day(df_day: pd.DataFrame) -> tuple[list, dict]:
-    if df_day.empty:
-        return [], {}
-
-    # Make sure Close is a numeric Series
-    closes = pd.to_numeric(df_day["Close"], errors="coerce").astype(float)
-    rsi = compute_rsi(closes, RSI_WINDOW)
-
-    cash: float = float(START_CASH)
-    shares: float = 0.0
-    entry_price: float | None = None
-    entry_time = None
+@njit(cache=True)
+def _run_day(close, rsi, ts_ns, start, buy_thr, sell_thr, sl_pct, min_hold_ns, slip, fee, start_cash):
+    """
+    Bar-by-bar RSI strategy over one session, deciding from bar `start` on (bars before it
+    are RSI warm-up; flat in cash, so equity/drawdown need no update). Trades are written
+    into preallocated arrays (bar index, side 1=BUY/-1=SELL, fill price, PnL fraction, REASON_*
+    code); only the first n_trades entries are valid. A position still open after the last
+    bar is closed there with REASON_EOD, which is why the buffers have one spare slot.
+    """
+    n = close.shape[0]
+    trade_idx = np.empty(n + 1, dtype=np.int64)
+    trade_side = np.empty(n + 1, dtype=np.int8)
+    trade_price = np.empty(n + 1, dtype=np.float64)
+    trade_pnl = np.full(n + 1, np.nan)
+    trade_reason = np.full(n + 1, REASON_NONE, dtype=np.int8)
+    k = 0
 
-    peak_equity: float = float(START_CASH)
-    max_drawdown: float = 0.0
-    trades: list[dict] = []
+    cash = start_cash
+    shares = 0.0
+    entry_price = 0.0
+    entry_ts_ns = 0
+    peak_equity = start_cash
+    max_dd = 0.0
 
-    # iterate with iat to guarantee a scalar float
-    for i in range(len(closes)):
-        ts = closes.index[i]
-        price = float(closes.iat[i])
-        cur_rsi = float(rsi.iat[i])
+    for i in range(start, n):
+        price = close[i]
+        cur_rsi = rsi[i]
 
-        equity = float(cash + shares * price)
+        equity = cash + shares * price
         if equity > peak_equity:
             peak_equity = equity
         if peak_equity > 0:
             dd = (equity - peak_equity) / peak_equity
-            if dd < max_drawdown:
-                max_drawdown = dd
+            if dd < max_dd:
+                max_dd = dd
 
         if shares == 0.0:
-            if cur_rsi < BUY_RSI:
-                buy_px = price * (1 + SLIPPAGE_BPS / 1e4)
-                if buy_px > 0 and cash > FEE_PER_TRADE:
-                    shares = (cash - FEE_PER_TRADE) / buy_px
+            if cur_rsi < buy_thr:
+                buy_px = price * (1 + slip)
+                if buy_px > 0 and cash > fee:
+                    shares = (cash - fee) / buy_px
                     cash = 0.0
-                    entry_price = float(buy_px)
-                    entry_time = ts
-                    trades.append({"Time": ts, "Side": "BUY", "Price": round(buy_px, 4), "RSI": round(cur_rsi, 2)})
+                    entry_price = buy_px
+                    entry_ts_ns = ts_ns[i]
+                    trade_idx[k] = i
+                    trade_side[k] = 1
+                    trade_price[k] = buy_px
+                    k += 1
         else:
-            held_mins = int((ts - entry_time).total_seconds() // 60)
-            stop_hit = price <= entry_price * (1 - STOP_LOSS_PCT)
-            exit_signal = (cur_rsi > SELL_RSI) and (held_mins >= MIN_HOLD_MINUTES)
+            stop_hit = price <= entry_price * (1 - sl_pct)
+            exit_signal = (cur_rsi > sell_thr) and (ts_ns[i] - entry_ts_ns >= min_hold_ns)
 
             if stop_hit or exit_signal:
-                sell_px = price * (1 - SLIPPAGE_BPS / 1e4)
-                cash = float(shares * sell_px - FEE_PER_TRADE)
-                pnl = (sell_px - entry_price) / entry_price
-                trades.append({
-                    "Time": ts, "Side": "SELL", "Price": round(sell_px, 4),
-                    "RSI": round(cur_rsi, 2), "Reason": "STOP" if stop_hit else "RSI>65",
-                    "PnL_%": round(pnl * 100, 3)
-                })
+                sell_px = price * (1 - slip)
+                cash = shares * sell_px - fee
+                trade_idx[k] = i
+                trade_side[k] = -1
+                trade_price[k] = sell_px
+                trade_pnl[k] = (sell_px - entry_price) / entry_price
+                trade_reason[k] = REASON_STOP if stop_hit else REASON_RSI
+                k += 1
                 shares = 0.0
-                entry_price, entry_time = None, None
+                entry_price = 0.0
 
-    # close any open position at end of day
     if shares > 0.0:
-        last_ts = closes.index[-1]
-        last_px = float(closes.iat[-1]) * (1 - SLIPPAGE_BPS / 1e4)
-        cash = float(shares * last_px - FEE_PER_TRADE)
-        pnl = (last_px - entry_price) / entry_price
-        trades.append({
-            "Time": last_ts, "Side": "SELL", "Price": round(last_px, 4),
-            "RSI": round(float(rsi.iat[-1]), 2), "Reason": "EOD", "PnL_%": round(pnl * 100, 3)
-        })
-        shares = 0.0
+        sell_px = close[n - 1] * (1 - slip)
+        cash = shares * sell_px - fee
+        trade_idx[k] = n - 1
+        trade_side[k] = -1
+        trade_price[k] = sell_px
+        trade_pnl[k] = (sell_px - entry_price) / entry_price
+        trade_reason[k] = REASON_EOD
+        k += 1
+
+    return trade_idx, trade_side, trade_price, trade_pnl, trade_reason, k, cash, max_dd
+
+
+def backtest_day(price_arr: np.ndarray, rsi_arr: np.ndarray, ts_ns: np.ndarray,
+                 warmup: int = 0) -> tuple[dict, dict]:
+    """
+    Backtest one session from already-sliced arrays: float64 closes, RSI computed over
+    the full history (so it carries over from the prior day), and UTC int64 ns timestamps.
+    No trades are taken on the first `warmup` bars.
+    Trades come back as a dict of equal-length column arrays (one entry per fill; zero-length
+    when nothing traded or there are no bars), unrounded and with int8 REASON_* codes;
+    labels and rounding are applied when the trade log is written.
+    """
+    (trade_idx, trade_side, trade_price, trade_pnl, trade_reason,
+     n_trades, cash, max_drawdown) = _run_day(
+        price_arr, rsi_arr, ts_ns, min(max(warmup, 0), len(price_arr)),
+        float(BUY_RSI), float(SELL_RSI), float(STOP_LOSS_PCT),
+        MIN_HOLD_MINUTES * 60 * 1_000_000_000,
+        SLIPPAGE_BPS / 1e4, float(FEE_PER_TRADE), float(START_CASH),
+    )
+
+    idx = trade_idx[:n_trades]
+    side = trade_side[:n_trades]
+    trades = {
+        "Time": pd.to_datetime(ts_ns[idx], unit="ns", utc=True).tz_convert(TZ_NY),
+        "Side": np.where(side == 1, "BUY", "SELL"),
+        "Price": trade_price[:n_trades],
+        "RSI": rsi_arr[idx],
+        "reason_code": trade_reason[:n_trades],
+        "PnL_%": trade_pnl[:n_trades] * 100,
+    }
 
     final_equity = float(cash)
     total_return = final_equity / START_CASH - 1.0
-    pnl_list = [t["PnL_%"] for t in trades if t["Side"] == "SELL" and "PnL_%" in t]
-    win_rate = (np.array(pnl_list) > 0).mean() * 100 if pnl_list else np.nan
+    pnl_sells = trades["PnL_%"][side == -1]
+    win_rate = (pnl_sells > 0).mean() * 100 if len(pnl_sells) else np.nan
 
     summary = {
-        "trades": len(pnl_list),
+        "trades": len(pnl_sells),
         "final_equity": round(final_equity, 2),
         "total_return_%": round(total_return * 100, 2),
         "win_rate_%": None if np.isnan(win_rate) else round(float(win_rate), 1),
@@ -164,30 +211,127 @@ def backtest_day(df_day: pd.DataFrame) -> tuple[list, dict]:
     }
     return trades, summary
 
+@njit(cache=True, parallel=True)
+def _sweep(close, rsi, ts_ns, bounds, warmup, grid, slip, fee, start_cash):
+    """
+    Run _run_day for every grid row (buy_thr, sell_thr, sl_pct, min_hold_minutes) over every
+    session in bounds, one row per thread. Returns per-row (n_params, n_days) arrays of final
+    equity, max drawdown, closed trades and winning trades.
+    """
+    n_params = grid.shape[0]
+    n_days = bounds.shape[0] - 1
+    equity = np.empty((n_params, n_days))
+    max_dd = np.empty((n_params, n_days))
+    n_sells = np.zeros((n_params, n_days), dtype=np.int64)
+    n_wins = np.zeros((n_params, n_days), dtype=np.int64)
+    for p in prange(n_params):
+        min_hold_ns = np.int64(grid[p, 3] * 60 * 1_000_000_000)
+        for d in range(n_days):
+            lo = bounds[d]
+            hi = bounds[d + 1]
+            start = min(max(warmup - lo, 0), hi - lo)
+            _, side, _, pnl, _, k, cash, dd = _run_day(
+                close[lo:hi], rsi[lo:hi], ts_ns[lo:hi], start,
+                grid[p, 0], grid[p, 1], grid[p, 2], min_hold_ns, slip, fee, start_cash,
+            )
+            for j in range(k):
+                if side[j] == -1:
+                    n_sells[p, d] += 1
+                    if pnl[j] > 0:
+                        n_wins[p, d] += 1
+            equity[p, d] = cash
+            max_dd[p, d] = dd
+    return equity, max_dd, n_sells, n_wins
+
+
+def session_arrays(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Flatten fetch_recent_days output into (closes, RSI, UTC ns timestamps, day ids, bounds),
+    where session i spans [bounds[i], bounds[i+1]). RSI is causal, so it is computed once
+    over every session rather than per day.
+    """
+    price_arr = df["Close"].to_numpy(dtype=np.float64)
+    rsi_arr = rsi_ndarray(price_arr, RSI_WINDOW)
+    ts_ns = df.index.as_unit("ns").asi8
+    day_id = df["__day__"].to_numpy()
+    bounds = np.append(np.searchsorted(day_id, np.unique(day_id)), len(day_id))
+    return price_arr, rsi_arr, ts_ns, day_id, bounds
+
+def run_sweep(params_grid, price_arr: np.ndarray, rsi_arr: np.ndarray, ts_ns: np.ndarray,
+              bounds: np.ndarray) -> pd.DataFrame:
+    """
+    Backtest every (buy_rsi, sell_rsi, stop_loss_pct, min_hold_minutes) combination in
+    params_grid across all sessions in parallel; one summary row per combination.
+    """
+    grid = np.asarray(params_grid, dtype=np.float64).reshape(-1, 4)
+    equity, max_dd, n_sells, n_wins = _sweep(
+        price_arr, rsi_arr, ts_ns, bounds.astype(np.int64), RSI_WINDOW, grid,
+        SLIPPAGE_BPS / 1e4, float(FEE_PER_TRADE), float(START_CASH),
+    )
+    trades = n_sells.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        win_rate = n_wins.sum(axis=1) / trades * 100
+    return pd.DataFrame({
+        "buy_rsi": grid[:, 0],
+        "sell_rsi": grid[:, 1],
+        "stop_loss_pct": grid[:, 2],
+        "min_hold_minutes": grid[:, 3].astype(np.int64),
+        "trades": trades,
+        "avg_daily_return_%": ((equity / START_CASH - 1.0) * 100).mean(axis=1).round(3),
+        "win_rate_%": win_rate.round(1),
+        "worst_drawdown_%": (np.abs(max_dd).max(axis=1) * 100).round(2),
+    })
+
 def run():
     df = fetch_recent_days(SYMBOL, DAYS_TO_TEST)
     if df.empty:
         print("No data returned; try during market week and check internet.")
         return
 
-    df["__day__"] = df.index.date
+    price_arr, rsi_arr, ts_ns, day_id, bounds = session_arrays(df)
     daily_rows = []
-    all_trades = []
-    for day, chunk in df.groupby("__day__"):
-        trades, summ = backtest_day(chunk.drop(columns="__day__", errors="ignore"))
+    trade_frames = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        day = np.datetime64(int(day_id[start]), "D")
+        # only the oldest session lacks prior bars to warm RSI up with
+        trades, summ = backtest_day(price_arr[start:end], rsi_arr[start:end], ts_ns[start:end],
+                                    warmup=RSI_WINDOW - start)
         summ["date"] = str(day)
         daily_rows.append(summ)
-        for t in trades:
-            t["date"] = str(day)
-            all_trades.append(t)
+        if len(trades["Side"]):
+            trade_frames.append(pd.DataFrame({
+                "Time": trades["Time"], "Side": trades["Side"], "Price": trades["Price"],
+                "RSI": trades["RSI"], "date": str(day), "reason_code": trades["reason_code"],
+                "PnL_%": trades["PnL_%"],
+            }))
 
     res = pd.DataFrame(daily_rows).sort_values("date")
     print("\n=== NVDA 1m RSI Backtest (last {} sessions) ===".format(len(res)))
     print(res.to_string(index=False))
 
-    if all_trades:
-        pd.DataFrame(all_trades).to_csv("nvda_1m_backtest_trades.csv", index=False)
-        print("\nSaved trades -> nvda_1m_backtest_trades.csv")
+    if trade_frames:
+        log = pd.concat(trade_frames, ignore_index=True)
+        # categorical keeps the int8 codes on disk with their labels; BUY rows (-1) are null
+        log["reason_code"] = pd.Categorical.from_codes(log["reason_code"], categories=REASON_LABELS)
+        log = log.rename(columns={"reason_code": "Reason"}).round(TRADE_DECIMALS)
+        log.to_parquet("nvda_1m_backtest_trades.parquet", index=False)
+        print("\nSaved trades -> nvda_1m_backtest_trades.parquet")
+
+def sweep():
+    df = fetch_recent_days(SYMBOL, DAYS_TO_TEST)
+    if df.empty:
+        print("No data returned; try during market week and check internet.")
+        return
+
+    price_arr, rsi_arr, ts_ns, _, bounds = session_arrays(df)
+    grid = list(itertools.product(SWEEP_BUY_RSI, SWEEP_SELL_RSI, SWEEP_STOP_LOSS_PCT, SWEEP_MIN_HOLD_MINUTES))
+    res = run_sweep(grid, price_arr, rsi_arr, ts_ns, bounds)
+    res = res.sort_values("avg_daily_return_%", ascending=False)
+    print("\n=== NVDA 1m RSI parameter sweep ({} combos, last {} sessions) ===".format(len(res), len(bounds) - 1))
+    print(res.head(20).to_string(index=False))
 
 if __name__ == "__main__":
-    run()
+    if "--sweep" in sys.argv[1:]:
+        sweep()
+    else:
+        run()
@@ -0,0 +1,45 @@
+# data_cache.py — on-disk Parquet cache for yfinance downloads (skips the network on repeat runs)
+import hashlib
+import os
+import time
+
+import pandas as pd
+import yfinance as yf
+
+CACHE_DIR = ".cache"
+
+
+def _cache_path(symbol: str, period: str, interval: str) -> str:
+    key = hashlib.sha1(f"{symbol}|{period}|{interval}".encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"{key}.parquet")
+
+
+def _download(symbol: str, period: str, interval: str, session=None) -> pd.DataFrame:
+    df = yf.download(symbol, period=period, interval=interval, auto_adjust=True, progress=False,
+                     session=session)
+    return pd.DataFrame() if df is None else df
+
+
+def load_or_fetch(symbol: str, period: str, interval: str, ttl_seconds: float, session=None) -> pd.DataFrame:
+    """
+    Return yf.download(symbol, period, interval) output, served from CACHE_DIR when the
+    cached file is younger than ttl_seconds. Empty downloads are returned but never cached;
+    ttl_seconds <= 0 bypasses the cache entirely (no read, no write).
+    Pass a long-lived HTTP session to reuse one connection across repeated fetches.
+    """
+    if ttl_seconds <= 0:
+        return _download(symbol, period, interval, session)
+
+    path = _cache_path(symbol, period, interval)
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) < ttl_seconds:
+        return pd.read_parquet(path)
+
+    df = _download(symbol, period, interval, session)
+    if df.empty:
+        return df
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = path + ".tmp"
+    df.to_parquet(tmp)
+    os.replace(tmp, path)  # atomic swap so a concurrent reader never sees a partial file
+    return df
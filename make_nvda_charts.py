@@ -1,27 +1,21 @@
 import os
 from datetime import datetime
+from zoneinfo import ZoneInfo
 import pandas as pd
 import numpy as np
-import yfinance as yf
-import pytz
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 
-TZ_NY = pytz.timezone("America/New_York")
+from data_cache import load_or_fetch
+from market_hours import day_ids, regular_hours
+from rsi_core import rsi_series as compute_rsi
+
+TZ_NY = ZoneInfo("America/New_York")
 SYMBOL = "NVDA"
 RSI_WINDOW = 14
 BUY_RSI = 20
 SELL_RSI = 65
-
-def compute_rsi(series: pd.Series, window: int) -> pd.Series:
-    delta = series.diff()
-    gain = delta.clip(lower=0)
-    loss = -delta.clip(upper=0)
-    avg_gain = gain.ewm(alpha=1/window, adjust=False).mean()
-    avg_loss = loss.ewm(alpha=1/window, adjust=False).mean().replace(0, np.nan)
-    rs = avg_gain / avg_loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi.fillna(50)
+CACHE_TTL_SECONDS = 60
 
 def extract_close(df: pd.DataFrame, symbol: str) -> pd.Series:
     """Return a 1-D float Series of Close prices regardless of yfinance column shape."""
@@ -45,27 +39,32 @@ def extract_close(df: pd.DataFrame, symbol: str) -> pd.Series:
             s = df[matches[0]]
     return pd.to_numeric(s, errors="coerce").dropna().astype(float)
 
-def get_session_1m(symbol: str) -> pd.DataFrame:
-    # download a week to be safe, then filter to today's NY session (fallback to last session if after hours)
-    df = yf.download(symbol, period="7d", interval="1m", auto_adjust=True, progress=False)
+def _pick_session(df: pd.DataFrame) -> pd.DataFrame:
+    """Today's NY regular session from a raw yfinance frame (last session if after hours)."""
     if df is None or df.empty:
         return pd.DataFrame()
     if df.index.tz is None:
         df.index = df.index.tz_localize("UTC").tz_convert(TZ_NY)
     else:
         df.index = df.index.tz_convert(TZ_NY)
-    df = df.between_time("09:30", "16:00")
-    df["__day__"] = df.index.date
+    df = regular_hours(df)
+    if df.empty:
+        return pd.DataFrame()
 
-    today_ny = datetime.now(TZ_NY).date()
-    if (df["__day__"] == today_ny).any():
-        out = df[df["__day__"] == today_ny].copy()
-    else:
-        # market closed or weekend — use the most recent trading day
-        last_day = sorted(df["__day__"].unique())[-1]
-        out = df[df["__day__"] == last_day].copy()
+    # bars are time-sorted: find the day's [lo, hi) slice on int64 day ids, no date objects
+    day_id = day_ids(df.index)
+    today_id = np.datetime64(datetime.now(TZ_NY).date(), "D").astype(np.int64)
+    # market closed or weekend — fall back to the most recent trading day
+    target = today_id if (day_id == today_id).any() else day_id[-1]
+    lo, hi = np.searchsorted(day_id, [target, target + 1])
+    return df.iloc[lo:hi].copy()
 
-    out.drop(columns="__day__", inplace=True, errors="ignore")
+def get_session_1m(symbol: str) -> pd.DataFrame:
+    # two trading days covers today or the last session; widen only if that comes back empty
+    for period in ("2d", "5d"):
+        out = _pick_session(load_or_fetch(symbol, period, "1m", CACHE_TTL_SECONDS))
+        if not out.empty:
+            break
     return out
 
 def main():
@@ -78,28 +77,43 @@ def main():
     rsi = compute_rsi(close, RSI_WINDOW)
     session_date = close.index[0].date().isoformat()
 
-    # Price chart
-    fig1, ax1 = plt.subplots(figsize=(10, 4.5))
+    # Optional overlay of trades if exists
+    trades_path = "nvda_1m_paper_trades.parquet"
+    trades = pd.read_parquet(trades_path) if os.path.exists(trades_path) else None
+
+    # One figure, shared time axis: price, RSI with 20/65 guides, price with trades (if any)
+    nrows = 2 if trades is None else 3
+    fig, axes = plt.subplots(nrows, 1, figsize=(10, 4 * nrows), sharex=True, constrained_layout=True)
+    ax1, ax2 = axes[0], axes[1]
+
     ax1.plot(close.index, close.values)
     ax1.set_title(f"{SYMBOL} price — {session_date} (1m)")
     ax1.set_ylabel("Price")
-    ax1.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
-    fig1.tight_layout()
-    fig1.savefig("nvda_1m_price_today.png", dpi=150)
-    plt.close(fig1)
 
-    # RSI chart with 20/65 guides
-    fig2, ax2 = plt.subplots(figsize=(10, 4.5))
     ax2.plot(rsi.index, rsi.values)
     ax2.axhline(BUY_RSI, linestyle="--")
     ax2.axhline(SELL_RSI, linestyle="--")
     ax2.set_ylim(0, 100)
     ax2.set_title(f"RSI({RSI_WINDOW}) — {session_date} (1m)")
     ax2.set_ylabel("RSI")
-    ax2.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
-    fig2.tight_layout()
-    fig2.savefig("nvda_1m_rsi_today.png", dpi=150)
-    plt.close(fig2)
+
+    if trades is not None:
+        ax3 = axes[2]
+        ax3.plot(close.index, close.values)
+        buys = trades[trades["Side"] == "BUY"]
+        sells = trades[trades["Side"] == "SELL"]
+        if not buys.empty:
+            ax3.scatter(buys["Time"], buys["Price"], marker="^", s=40)
+        if not sells.empty:
+            ax3.scatter(sells["Time"], sells["Price"], marker="v", s=40)
+        ax3.set_title(f"{SYMBOL} price with trades — {session_date} (1m)")
+        ax3.set_ylabel("Price")
+
+    # pin the shared axis to the session so trades from other days don't stretch every panel
+    ax1.set_xlim(close.index[0], close.index[-1])
+    ax1.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M", tz=TZ_NY))
+    fig.savefig("nvda_1m_report.png", dpi=150)
+    plt.close(fig)
 
     # One-row summary CSV
     summary = pd.DataFrame([{
@@ -111,28 +125,9 @@ def main():
     }])
     summary.to_csv("nvda_1m_today_summary.csv", index=False)
 
-    # Optional overlay of trades if exists
-    trades_path = "nvda_1m_paper_trades.csv"
-    if os.path.exists(trades_path):
-        trades = pd.read_csv(trades_path, parse_dates=["Time"])
-        fig3, ax3 = plt.subplots(figsize=(10, 4.5))
-        ax3.plot(close.index, close.values)
-        buys = trades[trades["Side"] == "BUY"]
-        sells = trades[trades["Side"] == "SELL"]
-        if not buys.empty:
-            ax3.scatter(buys["Time"], buys["Price"], marker="^", s=40)
-        if not sells.empty:
-            ax3.scatter(sells["Time"], sells["Price"], marker="v", s=40)
-        ax3.set_title(f"{SYMBOL} price with trades — {session_date} (1m)")
-        ax3.set_ylabel("Price")
-        ax3.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
-        fig3.tight_layout()
-        fig3.savefig("nvda_1m_price_trades_today.png", dpi=150)
-        plt.close(fig3)
-
-    print("Saved: nvda_1m_price_today.png, nvda_1m_rsi_today.png, nvda_1m_today_summary.csv")
-    if os.path.exists(trades_path):
-        print("Saved: nvda_1m_price_trades_today.png (with trade markers)")
+    print("Saved: nvda_1m_report.png, nvda_1m_today_summary.csv")
+    if trades is not None:
+        print("       (report includes a price panel with trade markers)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,18 @@
+# market_hours.py — NY session helpers on int64 wall-clock ns, shared by all scripts
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 86_400_000_000_000
+SESSION_OPEN_NS = (9 * 60 + 30) * 60 * 1_000_000_000   # 09:30 as ns since midnight
+SESSION_CLOSE_NS = 16 * 60 * 60 * 1_000_000_000        # 16:00
+
+
+def day_ids(index: pd.DatetimeIndex) -> np.ndarray:
+    """Integer NY calendar-day number (days since epoch) per bar, from wall-clock ns."""
+    return index.tz_localize(None).as_unit("ns").asi8 // NS_PER_DAY
+
+
+def regular_hours(df: pd.DataFrame) -> pd.DataFrame:
+    """Same rows as df.between_time("09:30", "16:00"), masked on int64 time-of-day."""
+    tod = df.index.tz_localize(None).as_unit("ns").asi8 % NS_PER_DAY
+    return df[(tod >= SESSION_OPEN_NS) & (tod <= SESSION_CLOSE_NS)]
@@ -1,10 +1,14 @@
 # paper_test_nvda_yf.py (VS Code live simulation, no broker)
 import time
 from datetime import datetime
+from zoneinfo import ZoneInfo
 import pandas as pd
 import numpy as np
-import yfinance as yf
-import pytz
+from curl_cffi import requests as curl_requests
+
+from data_cache import load_or_fetch
+from market_hours import day_ids, regular_hours
+from rsi_core import rsi_from_avgs, rsi_state, rsi_step
 
 SYMBOL = "NVDA"
 RSI_WINDOW = 14
@@ -15,28 +19,41 @@ MIN_HOLD_MINUTES = 5
 SLIPPAGE_BPS = 2
 FEE_PER_TRADE = 0.00
 START_CASH = 10000.0
+CACHE_TTL_SECONDS = 0    # no disk cache: polls are minute-gated, so a cached frame would never be reused
+
+TZ_NY = ZoneInfo("America/New_York")
+TRADE_DECIMALS = {"Price": 4, "RSI": 2, "PnL_%": 3}  # applied once when writing the trade log
 
-TZ_NY = pytz.timezone("America/New_York")
-
-def compute_rsi(series: pd.Series, window: int) -> pd.Series:
-    delta = series.diff()
-    gain = delta.clip(lower=0)
-    loss = -delta.clip(upper=0)
-    avg_gain = gain.ewm(alpha=1/window, adjust=False).mean()
-    avg_loss = loss.ewm(alpha=1/window, adjust=False).mean()
-    rs = avg_gain / (avg_loss.replace(0, np.nan))
-    rsi = 100 - (100 / (1 + rs))
-    return rsi.fillna(50)
-
-def get_today_1m(symbol: str) -> pd.DataFrame:
-    df = yf.download(symbol, period="1d", interval="1m", auto_adjust=True, progress=False)
-    if df is None or df.empty:
-        return pd.DataFrame()
+def get_today_1m(symbol: str, session=None) -> pd.DataFrame:
+    df = load_or_fetch(symbol, "1d", "1m", CACHE_TTL_SECONDS, session=session)
+    widened = df is None or df.empty
+    if widened:
+        # "1d" occasionally comes back empty; retry once with a wider window
+        df = load_or_fetch(symbol, "2d", "1m", CACHE_TTL_SECONDS, session=session)
+        if df is None or df.empty:
+            return pd.DataFrame()
     if df.index.tz is None:
         df.index = df.index.tz_localize("UTC").tz_convert(TZ_NY)
     else:
         df.index = df.index.tz_convert(TZ_NY)
-    return df.between_time("09:30", "16:00")
+    df = regular_hours(df)
+    if widened and not df.empty:
+        # keep only the latest session, as "1d" would have returned
+        day_id = day_ids(df.index)
+        df = df.iloc[np.searchsorted(day_id, day_id[-1]):]
+    return df
+
+def _close_series(df: pd.DataFrame) -> pd.Series:
+    """1-D Close prices whether yfinance returned flat or MultiIndex columns."""
+    closes = df["Close"]
+    if isinstance(closes, pd.DataFrame):  # yfinance MultiIndex columns
+        closes = closes.iloc[:, 0]
+    return closes
+
+def seconds_to_next_minute() -> float:
+    """Seconds until 2s past the next wall-clock minute, when yfinance has published the bar."""
+    now = datetime.now(TZ_NY)
+    return 60 - now.second - now.microsecond / 1e6 + 2
 
 def run_loop():
     cash = START_CASH
@@ -44,6 +61,12 @@ def run_loop():
     entry_price, entry_time = None, None
     trades = []
     last_ts = None
+    # RSI state through the last completed bar (the newest bar may still be forming)
+    avg_gain, avg_loss, prev_close, state_ts = None, None, None, None
+
+    # one HTTP session for the whole run: the TCP/TLS connection is reused across polls
+    # (curl_cffi, the session type yfinance itself uses for Yahoo)
+    session = curl_requests.Session(impersonate="chrome")
 
     print("Starting NVDA 1m paper test (Ctrl+C to stop).")
     while True:
@@ -52,22 +75,37 @@ def run_loop():
             print("Market closed. Exiting.")
             break
 
-        df = get_today_1m(SYMBOL)
+        df = get_today_1m(SYMBOL, session)
         if df.empty:
-            time.sleep(5)
+            time.sleep(seconds_to_next_minute())
             continue
 
-        closes = df["Close"]
-        rsi = compute_rsi(closes, RSI_WINDOW)
+        closes = _close_series(df)
         ts = closes.index[-1]
         price = float(closes.iloc[-1])
-        cur_rsi = float(rsi.iloc[-1])
 
         if last_ts is not None and ts == last_ts:
             time.sleep(3)  # wait for new bar
             continue
         last_ts = ts
 
+        # one EWMA step per newly completed bar instead of recomputing the whole day
+        completed = closes.iloc[:-1]
+        if avg_gain is None:
+            if len(completed):
+                avg_gain, avg_loss = rsi_state(completed.to_numpy(), RSI_WINDOW)
+                prev_close, state_ts = float(completed.iloc[-1]), completed.index[-1]
+        else:
+            start = completed.index.searchsorted(state_ts, side="right")
+            for px in completed.iloc[start:].to_numpy():
+                avg_gain, avg_loss = rsi_step(avg_gain, avg_loss, px - prev_close, RSI_WINDOW)
+                prev_close = float(px)
+            state_ts = completed.index[-1]
+        if avg_gain is None:
+            cur_rsi = 50.0
+        else:
+            cur_rsi = rsi_from_avgs(*rsi_step(avg_gain, avg_loss, price - prev_close, RSI_WINDOW))
+
         equity = cash + shares * price
         print(f"[{ts}] Price={price:.2f}  RSI={cur_rsi:.1f}  Equity=${equity:,.2f}")
 
@@ -77,7 +115,7 @@ def run_loop():
                 shares = (cash - FEE_PER_TRADE) / buy_px
                 cash = 0.0
                 entry_price, entry_time = buy_px, ts
-                trades.append({"Time": ts, "Side": "BUY", "Price": round(buy_px, 4), "RSI": round(cur_rsi, 2)})
+                trades.append({"Time": ts, "Side": "BUY", "Price": buy_px, "RSI": cur_rsi})
                 print(f" -> BUY @ {buy_px:.2f}")
         else:
             held = int((ts - entry_time).total_seconds() // 60)
@@ -88,28 +126,33 @@ def run_loop():
                 cash = shares * sell_px - FEE_PER_TRADE
                 pnl = (sell_px - entry_price) / entry_price
                 trades.append({
-                    "Time": ts, "Side": "SELL", "Price": round(sell_px, 4),
-                    "RSI": round(cur_rsi, 2),
+                    "Time": ts, "Side": "SELL", "Price": sell_px,
+                    "RSI": cur_rsi,
                     "Reason": "STOP" if stop_hit else "RSI>65",
-                    "PnL_%": round(pnl*100, 3)
+                    "PnL_%": pnl*100
                 })
                 print(f" -> SELL ({'STOP' if stop_hit else 'RSI>65'}) @ {sell_px:.2f}  PnL={pnl*100:.2f}%")
                 shares = 0.0
                 entry_price, entry_time = None, None
 
-        time.sleep(5)  # gentle polling
+        # sleep until the next bar should be out instead of polling every few seconds
+        next_bar_eta = last_ts + pd.Timedelta(minutes=1) + pd.Timedelta(seconds=2)
+        time.sleep(max(1, (next_bar_eta - datetime.now(TZ_NY)).total_seconds()))
 
     if shares > 0:
-        last_px = float(get_today_1m(SYMBOL)["Close"].iloc[-1]) * (1 - SLIPPAGE_BPS/1e4)
+        df = get_today_1m(SYMBOL, session)
+        # fall back to the last price the loop saw if the final fetch comes back empty
+        last_close = float(_close_series(df).iloc[-1]) if not df.empty else price
+        last_px = last_close * (1 - SLIPPAGE_BPS/1e4)
         cash = shares * last_px - FEE_PER_TRADE
         pnl = (last_px - entry_price) / entry_price
-        trades.append({"Time": last_ts, "Side": "SELL", "Price": round(last_px, 4),
-                       "RSI": round(cur_rsi, 2), "Reason": "EOD", "PnL_%": round(pnl*100, 3)})
+        trades.append({"Time": last_ts, "Side": "SELL", "Price": last_px,
+                       "RSI": cur_rsi, "Reason": "EOD", "PnL_%": pnl*100})
         print(f" -> EOD SELL @ {last_px:.2f}  PnL={pnl*100:.2f}%")
 
     if trades:
-        pd.DataFrame(trades).to_csv("nvda_1m_paper_trades.csv", index=False)
-        print("Saved trades -> nvda_1m_paper_trades.csv")
+        pd.DataFrame(trades).round(TRADE_DECIMALS).to_parquet("nvda_1m_paper_trades.parquet", index=False)
+        print("Saved trades -> nvda_1m_paper_trades.parquet")
 
 if __name__ == "__main__":
     run_loop()
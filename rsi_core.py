@@ -0,0 +1,60 @@
+# rsi_core.py — shared RSI(14) implementation for the backtest, paper trader and charts
+import numpy as np
+import pandas as pd
+
+from _njit import njit
+
+
+@njit(cache=True)
+def _rsi_value(ag, al):
+    if al == 0.0:
+        return 100.0 if ag > 0.0 else 50.0
+    return 100 - 100 / (1 + ag / al)
+
+
+@njit(cache=True)
+def _rsi_update(ag, al, d, alpha):
+    """One EWMA step of (avg_gain, avg_loss); NaN state (no delta yet) is seeded with d, like ewm(adjust=False)."""
+    g = d if d > 0 else 0.0
+    l = -d if d < 0 else 0.0
+    if np.isnan(ag):
+        return g, l
+    return alpha * g + (1 - alpha) * ag, alpha * l + (1 - alpha) * al
+
+
+@njit(cache=True)
+def _rsi(close, window):
+    """Wilder RSI in one pass (EWMA with alpha=1/window); also returns the final (avg_gain, avg_loss)."""
+    n = close.shape[0]
+    out = np.full(n, 50.0)
+    alpha = 1.0 / window
+    ag = np.nan
+    al = np.nan
+    for i in range(1, n):
+        ag, al = _rsi_update(ag, al, close[i] - close[i - 1], alpha)
+        out[i] = _rsi_value(ag, al)
+    return out, ag, al
+
+
+def rsi_ndarray(close: np.ndarray, window: int) -> np.ndarray:
+    return _rsi(np.asarray(close, dtype=np.float64), window)[0]
+
+
+def rsi_series(s: pd.Series, window: int) -> pd.Series:
+    return pd.Series(rsi_ndarray(s.to_numpy(dtype=np.float64), window), index=s.index)
+
+
+def rsi_state(close: np.ndarray, window: int) -> tuple[float, float]:
+    """Final (avg_gain, avg_loss) after close; NaN when there is no delta yet."""
+    _, ag, al = _rsi(np.asarray(close, dtype=np.float64), window)
+    return float(ag), float(al)
+
+
+def rsi_step(avg_gain: float, avg_loss: float, delta: float, window: int) -> tuple[float, float]:
+    """Advance (avg_gain, avg_loss) by one bar, with the same update the vectorised kernel uses."""
+    ag, al = _rsi_update(float(avg_gain), float(avg_loss), float(delta), 1.0 / window)
+    return float(ag), float(al)
+
+
+def rsi_from_avgs(avg_gain: float, avg_loss: float) -> float:
+    return float(_rsi_value(avg_gain, avg_loss))